@@ -1,11 +1,24 @@
 """E-shop module for managing orders and shipping."""
 
+import struct
 import uuid
-from typing import Dict
-from dataclasses import dataclass
+from typing import Dict, Iterable, List
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from services import ShippingService
 
+# Binary session format: header (version, kind, item count), for orders a
+# length-prefixed order id, then per item a length-prefixed product name,
+# quantity and price snapshot. All fields are little-endian.
+SERIALIZATION_VERSION = 1
+_KIND_CART = 1
+_KIND_ORDER = 2
+_HEADER = struct.Struct("<BBI")
+_LENGTH = struct.Struct("<H")
+_ITEM = struct.Struct("<Id")
+_MAX_LENGTH = 0xFFFF
+_MAX_AMOUNT = 0xFFFFFFFF
+
 
 class Product:
     """Represents a product in the shop with name, price, and availability."""
@@ -52,11 +65,17 @@ class Product:
 
 
 class ShoppingCart:
-    """Represents a shopping cart that holds selected products."""
+    """Represents a shopping cart that holds selected products.
+
+    Prices are snapshotted when a product is added, so a restored session keeps
+    the price the customer saw even if the catalog price changed since.
+    """
     products: Dict[Product, int]
+    prices: Dict[Product, float]
 
     def __init__(self):
         self.products = {}
+        self.prices = {}
 
     def contains_product(self, product):
         """Checks if a product is in the cart."""
@@ -64,18 +83,20 @@ class ShoppingCart:
 
     def calculate_total(self):
         """Calculates the total cost of all products in the cart."""
-        return sum([p.price * count for p, count in self.products.items()])
+        return sum([self.prices.get(p, p.price) * count for p, count in self.products.items()])
 
     def add_product(self, product: Product, amount: int):
         """Adds a product to the shopping cart."""
         if not product.is_available(amount):
             raise ValueError(f"Product {product} has only {product.available_amount} items")
         self.products[product] = amount
+        self.prices.setdefault(product, product.price)
 
     def remove_product(self, product):
         """Removes a product from the shopping cart."""
         if product in self.products:
             del self.products[product]
+        self.prices.pop(product, None)
 
     def submit_cart_order(self):
         """Finalizes the shopping cart and prepares the order."""
@@ -84,19 +105,48 @@ class ShoppingCart:
             product.buy(count)
             product_ids.append(str(product))
         self.products.clear()
+        self.prices.clear()
 
         return product_ids
 
+    def to_bytes(self) -> bytes:
+        """Serializes the cart into the compact binary session format."""
+        return _pack(_KIND_CART, self)
+
+    @classmethod
+    def from_bytes(cls, data, catalog: Dict[str, Product]) -> "ShoppingCart":
+        """Restores a cart from bytes, resolving products against the catalog."""
+        return cls.load_many([data], catalog)[0]
+
+    @classmethod
+    def load_many(cls, blobs: Iterable, catalog: Dict[str, Product]) -> List["ShoppingCart"]:
+        """Restores many carts at once against a shared in-memory catalog."""
+        carts = []
+        for data in blobs:
+            view = memoryview(data)
+            offset, count = _unpack_header(view, _KIND_CART)
+            carts.append(_unpack_cart(view, offset, count, catalog))
+        return carts
+
 
 @dataclass
 class Order:
     """Represents a customer order."""
     cart: ShoppingCart
     shipping_service: ShippingService
-    order_id: str = str(uuid.uuid4())
+    order_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+    def place_order(self, shipping_type, due_date: datetime = None, idempotency_key: str = None):
+        """Places an order and schedules shipping.
+
+        Retries with the same idempotency key (the order id by default) return
+        the original shipping id instead of creating a new shipment; retries
+        answered from the in-process cache also do not buy the stock again.
+        """
+        shipping_id = self.shipping_service.find_shipping(self.order_id, idempotency_key)
+        if shipping_id is not None:
+            return shipping_id
 
-    def place_order(self, shipping_type, due_date: datetime = None):
-        """Places an order and schedules shipping."""
         if not due_date:
             due_date = datetime.now(timezone.utc) + timedelta(seconds=3)
         product_ids = self.cart.submit_cart_order()
@@ -104,7 +154,22 @@ class Order:
         return self.shipping_service.create_shipping(shipping_type,
                                                      product_ids,
                                                      self.order_id,
-                                                     due_date)
+                                                     due_date,
+                                                     idempotency_key)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the order id and cart contents into the binary session format."""
+        order_id = str(self.order_id).encode("utf-8")
+        return _pack(_KIND_ORDER, self.cart, order_id)
+
+    @classmethod
+    def from_bytes(cls, data, catalog: Dict[str, Product], shipping_service: ShippingService) -> "Order":
+        """Restores an order from bytes, resolving products against the catalog."""
+        view = memoryview(data)
+        offset, count = _unpack_header(view, _KIND_ORDER)
+        order_id, offset = _read_bytes(view, offset)
+        cart = _unpack_cart(view, offset, count, catalog)
+        return cls(cart, shipping_service, str(order_id, "utf-8"))
 
 
 @dataclass()
@@ -116,3 +181,65 @@ class Shipment:
     def check_shipping_status(self):
         """Checks the status of the shipment."""
         return self.shipping_service.check_status(self.shipping_id)
+
+
+def _pack(kind, cart: ShoppingCart, order_id: bytes = None) -> bytes:
+    """Packs cart items, and the order id for orders, into a single blob."""
+    parts = [_HEADER.pack(SERIALIZATION_VERSION, kind, len(cart.products))]
+    if order_id is not None:
+        parts.append(_pack_bytes(order_id))
+    for product, count in cart.products.items():
+        if not 0 <= count <= _MAX_AMOUNT:
+            raise ValueError(f"Amount {count} of product {product} cannot be serialized")
+        parts.append(_pack_bytes(product.name.encode("utf-8")))
+        parts.append(_ITEM.pack(count, cart.prices.get(product, product.price)))
+    return b"".join(parts)
+
+
+def _pack_bytes(value: bytes) -> bytes:
+    """Packs a length-prefixed field."""
+    if len(value) > _MAX_LENGTH:
+        raise ValueError("Field is too long to be serialized")
+    return _LENGTH.pack(len(value)) + value
+
+
+def _read_struct(fmt: struct.Struct, view: memoryview, offset):
+    """Unpacks fmt at offset and returns the values with the next offset."""
+    try:
+        return fmt.unpack_from(view, offset), offset + fmt.size
+    except struct.error:
+        raise ValueError("Serialized data is truncated") from None
+
+
+def _read_bytes(view: memoryview, offset):
+    """Reads a length-prefixed field and returns it with the next offset."""
+    (length,), offset = _read_struct(_LENGTH, view, offset)
+    if offset + length > len(view):
+        raise ValueError("Serialized data is truncated")
+    return view[offset:offset + length], offset + length
+
+
+def _unpack_header(view: memoryview, kind):
+    """Validates the blob header and returns the items offset and count."""
+    (version, actual_kind, count), offset = _read_struct(_HEADER, view, 0)
+    if version != SERIALIZATION_VERSION:
+        raise ValueError(f"Unsupported serialization version {version}")
+    if actual_kind != kind:
+        raise ValueError("Serialized data has unexpected kind")
+    return offset, count
+
+
+def _unpack_cart(view: memoryview, offset, count, catalog: Dict[str, Product]) -> ShoppingCart:
+    """Reads count items starting at offset into a new cart with their price snapshots."""
+    cart = ShoppingCart()
+    for _ in range(count):
+        name, offset = _read_bytes(view, offset)
+        (amount, price), offset = _read_struct(_ITEM, view, offset)
+        product = catalog.get(str(name, "utf-8"))
+        if product is None:
+            raise ValueError(f"Product {str(name, 'utf-8')} is not in the catalog")
+        cart.products[product] = amount
+        cart.prices[product] = price
+    if offset != len(view):
+        raise ValueError("Serialized data has trailing bytes")
+    return cart
@@ -0,0 +1,102 @@
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+
+class ShippingStatusBuffer:
+    """Write-behind buffer that coalesces shipping status updates per shipping_id.
+
+    Only the latest status of a shipment is written. Every ``put`` returns a
+    future that resolves with the writer's response once the write is
+    durable, so callers can delay acknowledging work until then.
+    """
+
+    def __init__(self, writer, max_size: int = 100, flush_interval: float = 0.5, max_workers: int = 8):
+        self.writer = writer
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._in_flight = {}
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = threading.Thread(target=self._run, name="shipping-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, shipping_id, status) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Shipping status buffer is closed")
+            while shipping_id not in self._pending and len(self._pending) >= self.max_size:
+                self._cond.notify_all()
+                self._cond.wait()
+                if self._closed:
+                    raise RuntimeError("Shipping status buffer is closed")
+            _, futures = self._pending.get(shipping_id, (None, []))
+            futures.append(future)
+            self._pending[shipping_id] = (status, futures)
+            if len(self._pending) >= self.max_size:
+                self._cond.notify_all()
+        return future
+
+    def pending_status(self, shipping_id):
+        with self._cond:
+            if shipping_id in self._pending:
+                return self._pending[shipping_id][0]
+            if shipping_id in self._in_flight:
+                return self._in_flight[shipping_id][0]
+            return None
+
+    def flush(self):
+        with self._cond:
+            batches = list(self._pending.values()) + list(self._in_flight.values())
+            futures = [f for _, fs in batches for f in fs]
+            self._flush_requested = True
+            self._cond.notify_all()
+        wait(futures)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or self._flush_requested or len(self._pending) >= self.max_size,
+                    timeout=self.flush_interval
+                )
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+                self._flush_requested = False
+                closed = self._closed
+                self._cond.notify_all()
+
+            self._write(batch)
+
+            with self._cond:
+                self._in_flight = {}
+            if closed:
+                return
+
+    def _write(self, batch):
+        writes = {
+            self._executor.submit(self.writer, shipping_id, status): futures
+            for shipping_id, (status, futures) in batch.items()
+        }
+        for write, futures in writes.items():
+            error = write.exception()
+            for future in futures:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(write.result())
@@ -0,0 +1,25 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class IdempotencyCache:
+    """Bounded in-process LRU cache of idempotency keys to shipping ids."""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            shipping_id = self._items.get(key)
+            if shipping_id is not None:
+                self._items.move_to_end(key)
+            return shipping_id
+
+    def put(self, key, shipping_id):
+        with self._lock:
+            self._items[key] = shipping_id
+            self._items.move_to_end(key)
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
@@ -4,3 +4,51 @@ AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL", "http://localhost:4566")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 SHIPPING_TABLE_NAME = os.getenv("SHIPPING_TABLE_NAME", "ShippingTable")
 SHIPPING_QUEUE = os.getenv("SHIPPING_QUEUE_NAME", "ShippingQueue")
+WRITE_BEHIND_MAX_SIZE = int(os.getenv("WRITE_BEHIND_MAX_SIZE", "100"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+WRITE_BEHIND_WORKERS = int(os.getenv("WRITE_BEHIND_WORKERS", "8"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+SHIPPING_REPUBLISH_AFTER = int(os.getenv("SHIPPING_REPUBLISH_AFTER", "300"))
+
+# Carrier registry: each shipping type has its own queue, concurrency budget
+# (in-flight batches) and processing policy (polling weight, batch size, long-poll wait).
+SHIPPING_CARRIERS = {
+    "Нова Пошта": {
+        "queue": os.getenv("NOVA_POSHTA_QUEUE_NAME", "ShippingQueue-NovaPoshta"),
+        "concurrency": int(os.getenv("NOVA_POSHTA_CONCURRENCY", "4")),
+        "weight": 3,
+        "batch_size": 10,
+        "wait_time_seconds": 10,
+    },
+    "Укр Пошта": {
+        "queue": os.getenv("UKR_POSHTA_QUEUE_NAME", "ShippingQueue-UkrPoshta"),
+        "concurrency": int(os.getenv("UKR_POSHTA_CONCURRENCY", "2")),
+        "weight": 2,
+        "batch_size": 10,
+        "wait_time_seconds": 10,
+    },
+    "Meest Express": {
+        "queue": os.getenv("MEEST_EXPRESS_QUEUE_NAME", "ShippingQueue-MeestExpress"),
+        "concurrency": int(os.getenv("MEEST_EXPRESS_CONCURRENCY", "2")),
+        "weight": 2,
+        "batch_size": 10,
+        "wait_time_seconds": 10,
+    },
+    "Самовивіз": {
+        "queue": os.getenv("PICKUP_QUEUE_NAME", "ShippingQueue-Pickup"),
+        "concurrency": int(os.getenv("PICKUP_CONCURRENCY", "2")),
+        "weight": 4,
+        "batch_size": 5,
+        "wait_time_seconds": 1,
+    },
+}
+
+# Batches in flight across all carriers; carrier weights decide how this shared budget is split
+SHIPPING_WORKER_MAX_IN_FLIGHT = int(os.getenv("SHIPPING_WORKER_MAX_IN_FLIGHT", "6"))
+# Policy for draining the shared SHIPPING_QUEUE used before per-carrier routing
+LEGACY_QUEUE_POLICY = {
+    "concurrency": 1,
+    "weight": 1,
+    "batch_size": 10,
+    "wait_time_seconds": 1,
+}
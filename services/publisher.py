@@ -1,10 +1,10 @@
 import boto3
 
-from .config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE
+from .config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE, SHIPPING_CARRIERS
 
 
 class ShippingPublisher:
-    def __init__(self):
+    def __init__(self, carriers: dict = None):
         self.client = boto3.client(
             "sqs",
             endpoint_url=AWS_ENDPOINT_URL,
@@ -14,25 +14,47 @@ class ShippingPublisher:
         )
         response = self.client.create_queue(QueueName=SHIPPING_QUEUE)
         self.queue_url = response["QueueUrl"]
+        self.carriers = carriers if carriers is not None else SHIPPING_CARRIERS
+        self.carrier_queue_urls = {
+            shipping_type: self.client.create_queue(QueueName=carrier["queue"])["QueueUrl"]
+            for shipping_type, carrier in self.carriers.items()
+        }
 
-    def send_new_shipping(self, shipping_id: str):
+    def get_queue_url(self, shipping_type: str = None):
+        if shipping_type is None:
+            return self.queue_url
+
+        return self.carrier_queue_urls[shipping_type]
+
+    def send_new_shipping(self, shipping_id: str, shipping_type: str = None):
         response = self.client.send_message(
-            QueueUrl=self.queue_url,
+            QueueUrl=self.get_queue_url(shipping_type),
             MessageBody=shipping_id
         )
 
         return response['MessageId']
 
-    def poll_shipping(self, batch_size: int = 10):
+    def poll_shipping(self, batch_size: int = 10, shipping_type: str = None, wait_time_seconds: int = 10):
+        messages = self.receive_shipping(batch_size, shipping_type, wait_time_seconds)
+
+        return [shipping_id for shipping_id, _ in messages]
+
+    def receive_shipping(self, batch_size: int = 10, shipping_type: str = None, wait_time_seconds: int = 10):
+        """Polls shipping ids together with the receipt handles needed to delete them."""
         messages = self.client.receive_message(
-            QueueUrl=self.queue_url,
+            QueueUrl=self.get_queue_url(shipping_type),
             MessageAttributeNames=['All'],
             MaxNumberOfMessages=batch_size,
-            WaitTimeSeconds=10
+            WaitTimeSeconds=wait_time_seconds
         )
 
         if 'Messages' not in messages:
             return []
 
-        return [msg['Body'] for msg in messages['Messages']]
+        return [(msg['Body'], msg['ReceiptHandle']) for msg in messages['Messages']]
 
+    def delete_shipping(self, receipt_handle: str, shipping_type: str = None):
+        return self.client.delete_message(
+            QueueUrl=self.get_queue_url(shipping_type),
+            ReceiptHandle=receipt_handle
+        )
@@ -1,24 +1,57 @@
-from .config import SHIPPING_TABLE_NAME
+from .buffer import ShippingStatusBuffer
+from .config import SHIPPING_TABLE_NAME, WRITE_BEHIND_MAX_SIZE, WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_WORKERS
 from .db import get_dynamodb_resource
 
-from uuid import uuid4
+from concurrent.futures import Future
+from uuid import NAMESPACE_URL, uuid4, uuid5
 from datetime import datetime, timezone
 
 
+class DuplicateShippingError(ValueError):
+    """Raised when a shipping was already created for the idempotency key."""
+
+    def __init__(self, shipping):
+        super().__init__("Shipping already exists for this order")
+        self.shipping = shipping
+        self.shipping_id = shipping["shipping_id"]
+
+
 class ShippingRepository:
+    IDEMPOTENCY_NAMESPACE = uuid5(NAMESPACE_URL, SHIPPING_TABLE_NAME)
 
 
-    def __init__(self):
+    def __init__(self, write_behind: bool = False):
         dynamo_resource = get_dynamodb_resource()
         self.table = dynamo_resource.Table(SHIPPING_TABLE_NAME)
+        self.buffer = None
+        if write_behind:
+            self.buffer = ShippingStatusBuffer(self._write_shipping_status,
+                                               max_size=WRITE_BEHIND_MAX_SIZE,
+                                               flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                                               max_workers=WRITE_BEHIND_WORKERS)
 
 
     def get_shipping(self, shipping_id):
         response = self.table.get_item(Key={"shipping_id": shipping_id})
-        return response.get("Item")
+        item = response.get("Item")
+        if item and self.buffer:
+            status = self.buffer.pending_status(shipping_id)
+            if status is not None:
+                item["shipping_status"] = status
+        return item
 
-    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
-        shipping_id = str(uuid4())
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime,
+                        idempotency_key: str = None):
+        """Stores a new shipping and returns its id.
+
+        With an idempotency key the shipping id is derived from the key and the
+        item is written with a conditional put, so a duplicate is rejected
+        atomically with DuplicateShippingError carrying the existing item.
+        """
+        if idempotency_key is None:
+            shipping_id = str(uuid4())
+        else:
+            shipping_id = self.shipping_id_for_key(idempotency_key)
         item = {
             "shipping_id": shipping_id,
             "shipping_type": shipping_type,
@@ -28,10 +61,72 @@ class ShippingRepository:
             "created_date": datetime.now(timezone.utc).isoformat(),
             "due_date": due_date.replace(tzinfo=timezone.utc).isoformat()
         }
-        self.table.put_item(Item=item)
+        if idempotency_key is None:
+            self.table.put_item(Item=item)
+            return shipping_id
+
+        try:
+            self.table.put_item(Item=item, ConditionExpression="attribute_not_exists(shipping_id)")
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise DuplicateShippingError(self.find_shipping(idempotency_key)) from None
         return shipping_id
 
-    def update_shipping_status(self, shipping_id, status):
+    def shipping_id_for_key(self, idempotency_key: str):
+        return str(uuid5(self.IDEMPOTENCY_NAMESPACE, idempotency_key))
+
+    def find_shipping(self, idempotency_key: str):
+        response = self.table.get_item(Key={"shipping_id": self.shipping_id_for_key(idempotency_key)},
+                                       ConsistentRead=True)
+        return response.get("Item")
+
+    def claim_republish(self, shipping_id, status, stale_before: datetime):
+        """Claims a stale shipping for republishing; only one caller per staleness window succeeds."""
+        cutoff = stale_before.isoformat()
+        try:
+            self.table.update_item(
+                Key={
+                    'shipping_id': shipping_id,
+                },
+                UpdateExpression='SET republished_date = :now',
+                ConditionExpression='shipping_status = :sh_status AND created_date < :cutoff '
+                                    'AND (attribute_not_exists(republished_date) OR republished_date < :cutoff)',
+                ExpressionAttributeValues={
+                    ':now': datetime.now(timezone.utc).isoformat(),
+                    ':sh_status': status,
+                    ':cutoff': cutoff
+                }
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def update_shipping_status(self, shipping_id, status, wait: bool = True):
+        """Updates the shipping status.
+
+        With ``wait=False`` a future is returned instead of the response; when the
+        write-behind buffer is enabled the update is coalesced with other updates
+        of the same shipment and the future resolves once it is written.
+        """
+        if self.buffer:
+            future = self.buffer.put(shipping_id, status)
+            return future.result() if wait else future
+
+        response = self._write_shipping_status(shipping_id, status)
+        if wait:
+            return response
+        future = Future()
+        future.set_result(response)
+        return future
+
+    def flush(self):
+        if self.buffer:
+            self.buffer.flush()
+
+    def close(self):
+        if self.buffer:
+            self.buffer.close()
+
+    def _write_shipping_status(self, shipping_id, status):
         response = self.table.update_item(
             Key={
                 'shipping_id': shipping_id,
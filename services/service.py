@@ -1,6 +1,10 @@
-from .repository import ShippingRepository
+from .cache import IdempotencyCache
+from .config import IDEMPOTENCY_CACHE_SIZE, SHIPPING_CARRIERS, SHIPPING_REPUBLISH_AFTER
+from .repository import ShippingRepository, DuplicateShippingError
 from .publisher import ShippingPublisher
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+_SHIPPING_TYPES = list(SHIPPING_CARRIERS)
 
 
 class ShippingService:
@@ -9,53 +13,107 @@ class ShippingService:
     SHIPPING_COMPLETED: str = 'completed'
     SHIPPING_FAILED: str = 'failed'
 
-    def __init__(self, repository, publisher):
+    def __init__(self, repository, publisher, carriers: dict = None):
         self.repository = repository
         self.publisher = publisher
+        # Must be the same registry the publisher routes with
+        self.carriers = carriers if carriers is not None else SHIPPING_CARRIERS
+        self.idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
 
     @staticmethod
     def list_available_shipping_type():
-        return ['Нова Пошта', 'Укр Пошта', 'Meest Express', 'Самовивіз']
+        return _SHIPPING_TYPES
 
-    def create_shipping(self, shipping_type, product_ids, order_id, due_date):
-        if shipping_type not in self.list_available_shipping_type():
+    def create_shipping(self, shipping_type, product_ids, order_id, due_date, idempotency_key=None):
+        if shipping_type not in self.carriers:
             raise ValueError("Shipping type is not available")
 
         if due_date <= datetime.now(timezone.utc):
             raise ValueError("Shipping due datetime must be greater than datetime now")
 
-        shipping_id = self.repository.create_shipping(shipping_type, product_ids, order_id, self.SHIPPING_CREATED, due_date)
+        # Retries of the same order return the original shipping instead of creating a new one
+        idempotency_key = self._idempotency_key(order_id, idempotency_key)
+        shipping_id = self.idempotency_cache.get(idempotency_key)
+        if shipping_id is not None:
+            return shipping_id
+
+        try:
+            # The shipping is stored as in progress right away, so no status write follows the publish
+            shipping_id = self.repository.create_shipping(shipping_type, product_ids, order_id,
+                                                          self.SHIPPING_IN_PROGRESS, due_date,
+                                                          idempotency_key=idempotency_key)
+        except DuplicateShippingError as e:
+            return self._resume_shipping(e.shipping, idempotency_key)
+
+        self.publisher.send_new_shipping(shipping_id, shipping_type)
+        self.idempotency_cache.put(idempotency_key, shipping_id)
 
-        self.publisher.send_new_shipping(shipping_id)
-        self.repository.update_shipping_status(shipping_id, self.SHIPPING_IN_PROGRESS)
+        return shipping_id
+
+    def find_shipping(self, order_id, idempotency_key=None):
+        """Returns the cached shipping id of an order placed by this process, or None."""
+        return self.idempotency_cache.get(self._idempotency_key(order_id, idempotency_key))
+
+    def _resume_shipping(self, shipping, idempotency_key):
+        shipping_id = shipping["shipping_id"]
+        # A shipping still in progress long after it was created was most likely never published.
+        # Fresh duplicates are left alone, since the first attempt may still be publishing, and
+        # the conditional claim lets only one retry publish a stale shipping again.
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=SHIPPING_REPUBLISH_AFTER)
+        if (shipping["shipping_status"] == self.SHIPPING_IN_PROGRESS
+                and datetime.fromisoformat(shipping["created_date"]) < stale_before
+                and self.repository.claim_republish(shipping_id, self.SHIPPING_IN_PROGRESS, stale_before)):
+            self.publisher.send_new_shipping(shipping_id, shipping["shipping_type"])
+        self.idempotency_cache.put(idempotency_key, shipping_id)
 
         return shipping_id
 
-    def process_shipping_batch(self):
+    def process_shipping_batch(self, shipping_type=None, batch_size: int = 10, wait_time_seconds: int = 10):
+        """Processes one batch of queued shippings.
+
+        With the write-behind buffer the status writes of the batch go out
+        concurrently in one flush instead of one synchronous write per message,
+        and repeated updates of a shipment (e.g. a redelivered message) are
+        merged into one write.
+        """
         result = []
-        shipping = self.publisher.poll_shipping()
-        for shipping_id in shipping:
-            shipping = self.process_shipping(shipping_id)
-            result.append(shipping)
+        messages = self.publisher.receive_shipping(batch_size, shipping_type, wait_time_seconds)
+        pending = [(receipt_handle, self.process_shipping(shipping_id, wait=False))
+                   for shipping_id, receipt_handle in messages]
+        self.repository.flush()
+        for receipt_handle, future in pending:
+            response = future.result()
+            # The message is removed from the queue only once its status write is durable
+            self.publisher.delete_shipping(receipt_handle, shipping_type)
+            result.append(response['ResponseMetadata'])
 
         return result
 
-    def process_shipping(self, shipping_id):
+    def process_shipping(self, shipping_id, wait: bool = True):
         shipping = self.repository.get_shipping(shipping_id)
         if datetime.fromisoformat(shipping['due_date']) < datetime.now(timezone.utc):
-            return self.fail_shipping(shipping_id)
+            return self.fail_shipping(shipping_id, wait)
 
-        return self.complete_shipping(shipping_id)
+        return self.complete_shipping(shipping_id, wait)
 
     def check_status(self, shipping_id):
         shipping = self.repository.get_shipping(shipping_id)
 
         return shipping['shipping_status']
 
-    def fail_shipping(self, shipping_id):
-        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_FAILED)
-        return response['ResponseMetadata']
+    def fail_shipping(self, shipping_id, wait: bool = True):
+        return self._update_status(shipping_id, self.SHIPPING_FAILED, wait)
+
+    def complete_shipping(self, shipping_id, wait: bool = True):
+        return self._update_status(shipping_id, self.SHIPPING_COMPLETED, wait)
+
+    @staticmethod
+    def _idempotency_key(order_id, idempotency_key):
+        return str(idempotency_key if idempotency_key is not None else order_id)
+
+    def _update_status(self, shipping_id, status, wait):
+        if not wait:
+            return self.repository.update_shipping_status(shipping_id, status, wait=False)
 
-    def complete_shipping(self, shipping_id):
-        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_COMPLETED)
+        response = self.repository.update_shipping_status(shipping_id, status)
         return response['ResponseMetadata']
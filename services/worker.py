@@ -0,0 +1,92 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import LEGACY_QUEUE_POLICY, SHIPPING_QUEUE, SHIPPING_WORKER_MAX_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Returned by _acquire_lane when no budget is left; None is the legacy queue lane
+_NO_LANE = object()
+
+
+class ShippingWorker:
+    """Consumes the per-carrier shipping queues with weighted fairness.
+
+    Each carrier has its own worker pool and a cap of in-flight batches, so a
+    slow carrier only backs up its own queue. All carriers share a budget of
+    max_in_flight batches, which is split between the carriers with spare
+    capacity by smooth weighted round-robin on their configured weight. Each
+    batch is polled with the carrier's own batch size and wait time.
+
+    The shared queue used before per-carrier routing is consumed as one more
+    lane until a poll comes back empty, so messages left there are not stranded.
+    """
+
+    def __init__(self, shipping_service, carriers: dict = None, max_in_flight: int = SHIPPING_WORKER_MAX_IN_FLIGHT,
+                 drain_legacy_queue: bool = True):
+        self.shipping_service = shipping_service
+        self.lanes = dict(carriers if carriers is not None else shipping_service.carriers)
+        if drain_legacy_queue:
+            self.lanes[None] = LEGACY_QUEUE_POLICY
+        self.max_in_flight = max_in_flight
+        self.pools = {
+            shipping_type: ThreadPoolExecutor(max_workers=lane["concurrency"])
+            for shipping_type, lane in self.lanes.items()
+        }
+        self._in_flight = {shipping_type: 0 for shipping_type in self.lanes}
+        self._current_weights = {shipping_type: 0 for shipping_type in self.lanes}
+        self._cond = threading.Condition()
+
+    def dispatch(self):
+        """Submits one batch for the next carrier; returns None when no budget is left."""
+        shipping_type = self._acquire_lane()
+        if shipping_type is _NO_LANE:
+            return None
+
+        lane = self.lanes[shipping_type]
+        future = self.pools[shipping_type].submit(self.shipping_service.process_shipping_batch, shipping_type,
+                                                  lane["batch_size"], lane["wait_time_seconds"])
+        future.add_done_callback(lambda f: self._complete_batch(shipping_type, f))
+        return future
+
+    def run(self, stop_event: threading.Event):
+        """Dispatches batches until stop_event is set, then waits for the pending ones."""
+        try:
+            while not stop_event.is_set():
+                if self.dispatch() is None:
+                    with self._cond:
+                        self._cond.wait(timeout=1)
+        finally:
+            self.close()
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+
+    def _acquire_lane(self):
+        with self._cond:
+            if sum(self._in_flight.values()) >= self.max_in_flight:
+                return _NO_LANE
+            ready = [shipping_type for shipping_type, lane in self.lanes.items()
+                     if self._in_flight[shipping_type] < lane["concurrency"]]
+            if not ready:
+                return _NO_LANE
+
+            for shipping_type in ready:
+                self._current_weights[shipping_type] += self.lanes[shipping_type]["weight"]
+            selected = max(ready, key=self._current_weights.get)
+            self._current_weights[selected] -= sum(self.lanes[shipping_type]["weight"] for shipping_type in ready)
+            self._in_flight[selected] += 1
+            return selected
+
+    def _complete_batch(self, shipping_type, future):
+        error = future.exception()
+        if error is not None:
+            logger.error("Shipping batch for %s failed", shipping_type or SHIPPING_QUEUE, exc_info=error)
+        with self._cond:
+            if shipping_type is None and error is None and not future.result():
+                # The legacy queue is drained, so stop polling it
+                self.lanes.pop(None, None)
+            self._in_flight[shipping_type] -= 1
+            self._cond.notify_all()
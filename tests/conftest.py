@@ -31,13 +31,14 @@ def setup_localstack_resources():
         "sqs",
         endpoint_url=AWS_ENDPOINT_URL, region_name=AWS_REGION
     )
-    response = sqs_client.create_queue(QueueName=SHIPPING_QUEUE)
-    queue_url = response["QueueUrl"]
+    queue_names = [SHIPPING_QUEUE] + [carrier["queue"] for carrier in SHIPPING_CARRIERS.values()]
+    queue_urls = [sqs_client.create_queue(QueueName=name)["QueueUrl"] for name in queue_names]
 
     yield  # Всі тести йдуть тут
 
     dynamo_client.delete_table(TableName=SHIPPING_TABLE_NAME)
-    sqs_client.delete_queue(QueueUrl=queue_url)
+    for queue_url in queue_urls:
+        sqs_client.delete_queue(QueueUrl=queue_url)
 
 
 @pytest.fixture
@@ -1,13 +1,17 @@
 import uuid
+import threading
 import pytest
 import random
 import boto3
+from concurrent.futures import Future
 from datetime import datetime, timedelta, timezone
 from app.eshop import Product, ShoppingCart, Order
 from services import ShippingService
-from services.repository import ShippingRepository
+from services.repository import ShippingRepository, DuplicateShippingError
+from services.buffer import ShippingStatusBuffer
 from services.publisher import ShippingPublisher
-from services.config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE
+from services.config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_CARRIERS
+from services.worker import ShippingWorker
 
 
 @pytest.mark.parametrize("order_id, shipping_id", [
@@ -43,7 +47,7 @@ def test_place_order_with_mocked_repo(mocker, order_id, shipping_id):
     mock_repo.create_shipping.assert_called_with
     (ShippingService.list_available_shipping_type()[0],
      ["Product"], order_id, shipping_service.SHIPPING_CREATED, due_date)
-    mock_publisher.send_new_shipping.assert_called_with(shipping_id)
+    mock_publisher.send_new_shipping.assert_called_with(shipping_id, ShippingService.list_available_shipping_type()[0])
 
 
 def test_place_order_with_unavailable_shipping_type_fails(dynamo_resource):
@@ -91,7 +95,8 @@ def test_when_place_order_then_shipping_in_queue(dynamo_resource):
         endpoint_url=AWS_ENDPOINT_URL,
         region_name=AWS_REGION
     )
-    queue_url = sqs_client.get_queue_url(QueueName=SHIPPING_QUEUE)["QueueUrl"]
+    queue_url = sqs_client.get_queue_url(
+        QueueName=SHIPPING_CARRIERS[ShippingService.list_available_shipping_type()[0]]["queue"])["QueueUrl"]
     response = sqs_client.receive_message(
         QueueUrl=queue_url,
         MaxNumberOfMessages=1,
@@ -168,7 +173,8 @@ def test_shipping_added_to_queue(cart, shipping_service):
     )
     sqs_client = boto3.client("sqs", endpoint_url=AWS_ENDPOINT_URL,
                               region_name=AWS_REGION)
-    queue_url = sqs_client.get_queue_url(QueueName=SHIPPING_QUEUE)["QueueUrl"]
+    queue_url = sqs_client.get_queue_url(
+        QueueName=SHIPPING_CARRIERS[ShippingService.list_available_shipping_type()[0]]["queue"])["QueueUrl"]
     response = sqs_client.receive_message(QueueUrl=queue_url,
                                           MaxNumberOfMessages=1,
                                           WaitTimeSeconds=10)
@@ -243,3 +249,271 @@ def test_receive_message_from_queue():
     publisher.send_new_shipping("test_shipping_id")
     messages = publisher.poll_shipping()
     assert "test_shipping_id" in messages
+
+
+# 14. Тест об'єднання оновлень статусу у write-behind буфері
+def test_status_buffer_coalesces_updates(mocker):
+    writer = mocker.Mock(return_value={'ResponseMetadata': {'HTTPStatusCode': 200}})
+    buffer = ShippingStatusBuffer(writer, max_size=10, flush_interval=60)
+
+    first = buffer.put("shipping_1", ShippingService.SHIPPING_IN_PROGRESS)
+    second = buffer.put("shipping_1", ShippingService.SHIPPING_COMPLETED)
+    assert buffer.pending_status("shipping_1") == ShippingService.SHIPPING_COMPLETED
+
+    buffer.flush()
+    buffer.close()
+
+    writer.assert_called_once_with("shipping_1", ShippingService.SHIPPING_COMPLETED)
+    assert first.result() == second.result()
+
+
+# 15. Тест скидання буфера при досягненні максимального розміру
+def test_status_buffer_flushes_on_size(mocker):
+    writer = mocker.Mock(return_value={})
+    buffer = ShippingStatusBuffer(writer, max_size=2, flush_interval=60)
+
+    futures = [buffer.put(f"shipping_{i}", ShippingService.SHIPPING_COMPLETED) for i in range(2)]
+    for future in futures:
+        future.result(timeout=5)
+    buffer.close()
+
+    assert writer.call_count == 2
+
+
+# 16. Тест очікування записів, що вже виконуються, під час flush
+def test_status_buffer_flush_waits_for_in_flight():
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_writer(shipping_id, status):
+        started.set()
+        release.wait(5)
+        return {}
+
+    buffer = ShippingStatusBuffer(slow_writer, max_size=1, flush_interval=60)
+    future = buffer.put("shipping_1", ShippingService.SHIPPING_COMPLETED)
+    started.wait(5)
+    threading.Timer(0.2, release.set).start()
+    buffer.flush()
+    buffer.close()
+
+    assert future.done()
+
+
+# 17. Тест видалення повідомлення з черги лише після запису статусу
+def test_process_shipping_batch_deletes_after_write(mocker):
+    mock_repo = mocker.Mock()
+    mock_publisher = mocker.Mock()
+    mock_publisher.receive_shipping.return_value = [("shipping_1", "receipt_1")]
+    mock_repo.get_shipping.return_value = {
+        "due_date": (datetime.now(timezone.utc) + timedelta(minutes=1)).isoformat()
+    }
+    write = Future()
+    write.set_result({'ResponseMetadata': {'HTTPStatusCode': 200}})
+    mock_repo.update_shipping_status.return_value = write
+    shipping_service = ShippingService(mock_repo, mock_publisher)
+
+    result = shipping_service.process_shipping_batch()
+
+    assert result == [{'HTTPStatusCode': 200}]
+    mock_repo.flush.assert_called_once()
+    mock_publisher.delete_shipping.assert_called_once_with("receipt_1", None)
+
+
+# 18. Тест обробки доставки з write-behind репозиторієм
+def test_process_shipping_with_write_behind(cart):
+    repository = ShippingRepository(write_behind=True)
+    shipping_service = ShippingService(repository, ShippingPublisher())
+    order = Order(cart, shipping_service)
+    shipping_id = order.place_order(
+        ShippingService.list_available_shipping_type()[0],
+        due_date=datetime.now(timezone.utc) + timedelta(minutes=1)
+    )
+    assert shipping_service.check_status(shipping_id) == ShippingService.SHIPPING_IN_PROGRESS
+
+    shipping_service.process_shipping(shipping_id)
+    repository.close()
+
+    shipping = repository.table.get_item(Key={"shipping_id": shipping_id})["Item"]
+    assert shipping["shipping_status"] == ShippingService.SHIPPING_COMPLETED
+
+
+# 19. Тест повторного оформлення замовлення з тим самим ключем ідемпотентності
+def test_place_order_retry_returns_cached_shipping(mocker, cart):
+    mock_repo = mocker.Mock()
+    mock_publisher = mocker.Mock()
+    mock_repo.create_shipping.return_value = "shipping_1"
+    shipping_service = ShippingService(mock_repo, mock_publisher)
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+    order = Order(cart, shipping_service, "order_1")
+    first = order.place_order(ShippingService.list_available_shipping_type()[0], due_date=due_date)
+    second = order.place_order(ShippingService.list_available_shipping_type()[0], due_date=due_date)
+
+    assert first == second == "shipping_1"
+    mock_repo.create_shipping.assert_called_once()
+    mock_publisher.send_new_shipping.assert_called_once_with("shipping_1", ShippingService.list_available_shipping_type()[0])
+
+
+# 20. Тест відхилення дубліката умовним записом у репозиторії
+def test_create_shipping_duplicate_returns_original(mocker):
+    mock_repo = mocker.Mock()
+    mock_publisher = mocker.Mock()
+    mock_repo.create_shipping.side_effect = DuplicateShippingError({
+        "shipping_id": "shipping_1", "shipping_type": "Нова Пошта",
+        "shipping_status": ShippingService.SHIPPING_IN_PROGRESS,
+        "created_date": datetime.now(timezone.utc).isoformat()
+    })
+    shipping_service = ShippingService(mock_repo, mock_publisher)
+
+    shipping_id = shipping_service.create_shipping(ShippingService.list_available_shipping_type()[0], ["Product"],
+                                                   "order_1", datetime.now(timezone.utc) + timedelta(minutes=1))
+
+    assert shipping_id == "shipping_1"
+    mock_publisher.send_new_shipping.assert_not_called()
+    mock_repo.claim_republish.assert_not_called()
+    mock_repo.update_shipping_status.assert_not_called()
+
+
+# 21. Тест повторної публікації застарілого дубліката, який не потрапив у чергу
+def test_create_shipping_duplicate_republishes_stale(mocker):
+    mock_repo = mocker.Mock()
+    mock_publisher = mocker.Mock()
+    mock_repo.create_shipping.side_effect = DuplicateShippingError({
+        "shipping_id": "shipping_1", "shipping_type": "Самовивіз",
+        "shipping_status": ShippingService.SHIPPING_IN_PROGRESS,
+        "created_date": (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    })
+    mock_repo.claim_republish.return_value = True
+    shipping_service = ShippingService(mock_repo, mock_publisher)
+
+    shipping_id = shipping_service.create_shipping(ShippingService.list_available_shipping_type()[0], ["Product"],
+                                                   "order_1", datetime.now(timezone.utc) + timedelta(minutes=1))
+
+    assert shipping_id == "shipping_1"
+    mock_publisher.send_new_shipping.assert_called_once_with("shipping_1", "Самовивіз")
+
+
+# 22. Тест відмови від повторної публікації, якщо її вже заявив інший запит
+def test_create_shipping_stale_duplicate_claimed_elsewhere(mocker):
+    mock_repo = mocker.Mock()
+    mock_publisher = mocker.Mock()
+    mock_repo.create_shipping.side_effect = DuplicateShippingError({
+        "shipping_id": "shipping_1", "shipping_type": "Нова Пошта",
+        "shipping_status": ShippingService.SHIPPING_IN_PROGRESS,
+        "created_date": (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    })
+    mock_repo.claim_republish.return_value = False
+    shipping_service = ShippingService(mock_repo, mock_publisher)
+
+    shipping_id = shipping_service.create_shipping("Нова Пошта", ["Product"], "order_1",
+                                                   datetime.now(timezone.utc) + timedelta(minutes=1))
+
+    assert shipping_id == "shipping_1"
+    mock_publisher.send_new_shipping.assert_not_called()
+
+
+# 23. Тест збереження залишку товару при повторному оформленні замовлення
+def test_place_order_retry_does_not_buy_stock_again(mocker):
+    mock_repo = mocker.Mock()
+    mock_repo.create_shipping.return_value = "shipping_1"
+    shipping_service = ShippingService(mock_repo, mocker.Mock())
+    product = Product(name='Product', price=100, available_amount=10)
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+    for _ in range(2):
+        cart = ShoppingCart()
+        cart.add_product(product, 3)
+        Order(cart, shipping_service, "order_2").place_order("Нова Пошта", due_date=due_date)
+
+    assert product.available_amount == 7
+
+
+# 24. Тест ідемпотентності замовлення між різними екземплярами сервісу
+def test_place_order_idempotent_across_services(cart):
+    order_id = str(uuid.uuid4())
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=1)
+    first = Order(cart, ShippingService(ShippingRepository(), ShippingPublisher()), order_id).place_order(
+        ShippingService.list_available_shipping_type()[0], due_date=due_date)
+    second = Order(ShoppingCart(), ShippingService(ShippingRepository(), ShippingPublisher()), order_id).place_order(
+        ShippingService.list_available_shipping_type()[0], due_date=due_date)
+
+    assert first == second
+
+
+# 25. Тест маршрутизації доставки у чергу перевізника
+def test_shipping_routed_to_carrier_queue(cart, shipping_service):
+    shipping_type = "Самовивіз"
+    order = Order(cart, shipping_service)
+    shipping_id = order.place_order(shipping_type, due_date=datetime.now(timezone.utc) + timedelta(minutes=1))
+
+    messages = shipping_service.publisher.poll_shipping(shipping_type=shipping_type, wait_time_seconds=1)
+    assert shipping_id in messages
+
+
+# 26. Тест справедливого розподілу пакетів між перевізниками за вагою
+def test_worker_dispatches_by_weight(mocker):
+    mock_service = mocker.Mock()
+    carriers = {
+        "Нова Пошта": {"queue": "A", "concurrency": 10, "weight": 3, "batch_size": 10, "wait_time_seconds": 10},
+        "Самовивіз": {"queue": "B", "concurrency": 10, "weight": 1, "batch_size": 5, "wait_time_seconds": 1},
+    }
+    worker = ShippingWorker(mock_service, carriers, max_in_flight=1, drain_legacy_queue=False)
+    for _ in range(8):
+        future = None
+        while future is None:
+            future = worker.dispatch()
+        future.result()
+    worker.close()
+
+    dispatched = [c.args[0] for c in mock_service.process_shipping_batch.call_args_list]
+    assert dispatched.count("Нова Пошта") == 6
+    assert dispatched.count("Самовивіз") == 2
+
+
+# 27. Тест передачі політики перевізника та журналювання помилок пакета
+def test_worker_passes_carrier_policy_and_logs_errors(mocker, caplog):
+    mock_service = mocker.Mock()
+    mock_service.process_shipping_batch.side_effect = RuntimeError("write failed")
+    carriers = {"Custom": {"queue": "C", "concurrency": 1, "weight": 1, "batch_size": 5, "wait_time_seconds": 1}}
+    worker = ShippingWorker(mock_service, carriers, drain_legacy_queue=False)
+
+    stop_event = threading.Event()
+    threading.Timer(0.2, stop_event.set).start()
+    worker.run(stop_event)
+
+    mock_service.process_shipping_batch.assert_called_with("Custom", 5, 1)
+    assert "Shipping batch for Custom failed" in caplog.text
+
+
+# 28. Тест вичерпання старої спільної черги
+def test_worker_drains_legacy_queue(mocker):
+    mock_service = mocker.Mock()
+    mock_service.process_shipping_batch.return_value = []
+    carriers = {"Custom": {"queue": "C", "concurrency": 1, "weight": 1, "batch_size": 5, "wait_time_seconds": 1}}
+    worker = ShippingWorker(mock_service, carriers, max_in_flight=1)
+
+    for _ in range(4):
+        future = None
+        while future is None:
+            future = worker.dispatch()
+        future.result()
+    worker.close()
+
+    dispatched = [c.args[0] for c in mock_service.process_shipping_batch.call_args_list]
+    assert dispatched.count(None) == 1
+    assert None not in worker.lanes
+
+
+# 29. Тест перевірки типу доставки за реєстром перевізників сервісу
+def test_create_shipping_validates_against_service_registry(mocker):
+    mock_repo = mocker.Mock()
+    mock_publisher = mocker.Mock()
+    mock_repo.create_shipping.return_value = "shipping_1"
+    carriers = {"Custom": {"queue": "C", "concurrency": 1, "weight": 1, "batch_size": 5, "wait_time_seconds": 1}}
+    shipping_service = ShippingService(mock_repo, mock_publisher, carriers)
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+    assert shipping_service.create_shipping("Custom", ["Product"], "order_1", due_date) == "shipping_1"
+    with pytest.raises(ValueError):
+        shipping_service.create_shipping("Нова Пошта", ["Product"], "order_2", due_date)
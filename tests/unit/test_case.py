@@ -63,6 +63,58 @@ class TestCalculator(unittest.TestCase):
         self.cart.remove_product(self.product)
         self.assertFalse(self.cart.contains_product(self.product), "Продукт повинен бути видалений з кошика")
 
+    def test_cart_serialization_roundtrip(self):
+        self.cart.add_product(self.product, 4)
+        restored = ShoppingCart.from_bytes(self.cart.to_bytes(), {self.product.name: self.product})
+        self.assertEqual(restored.products, {self.product: 4}, "Кошик має відновитися з тими ж продуктами")
+
+    def test_cart_load_many(self):
+        self.cart.add_product(self.product, 2)
+        data = self.cart.to_bytes()
+        carts = ShoppingCart.load_many([data, data], {self.product.name: self.product})
+        self.assertEqual([cart.calculate_total() for cart in carts], [200, 200])
+
+    def test_cart_deserialization_unknown_product(self):
+        self.cart.add_product(self.product, 1)
+        with self.assertRaises(ValueError):
+            ShoppingCart.from_bytes(self.cart.to_bytes(), {})
+
+    def test_cart_deserialization_keeps_price_snapshot(self):
+        self.cart.add_product(self.product, 1)
+        data = self.cart.to_bytes()
+        self.product.price = 120
+        restored = ShoppingCart.from_bytes(data, {self.product.name: self.product})
+        self.assertEqual(restored.prices[self.product], 100, "Кошик має зберегти ціну на момент додавання")
+
+    def test_cart_total_uses_price_snapshot_after_restore(self):
+        self.cart.add_product(self.product, 2)
+        data = self.cart.to_bytes()
+        self.product.price = 150
+        restored = ShoppingCart.from_bytes(data, {self.product.name: self.product})
+        self.assertEqual(restored.calculate_total(), 200, "Сума кошика має рахуватися за збереженою ціною")
+
+    def test_cart_serialization_invalid_amount(self):
+        self.cart.add_product(self.product, -1)
+        with self.assertRaises(ValueError):
+            self.cart.to_bytes()
+
+    def test_cart_deserialization_invalid_length(self):
+        self.cart.add_product(self.product, 1)
+        data = self.cart.to_bytes()
+        catalog = {self.product.name: self.product}
+        with self.assertRaises(ValueError):
+            ShoppingCart.from_bytes(data[:-1], catalog)
+        with self.assertRaises(ValueError):
+            ShoppingCart.from_bytes(data + b"\x00", catalog)
+
+    def test_order_serialization_roundtrip(self):
+        self.cart.add_product(self.product, 3)
+        shipping_service = MagicMock()
+        order = Order(self.cart, shipping_service, "order_1")
+        restored = Order.from_bytes(order.to_bytes(), {self.product.name: self.product}, shipping_service)
+        self.assertEqual(restored.order_id, "order_1")
+        self.assertEqual(restored.cart.products, {self.product: 3})
+
 
 if __name__ == '__main__':
     unittest.main()